@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 import os
-import re
 import asyncio
+import functools
+from collections import defaultdict
+from datetime import datetime, timezone
+from time import time as _now
 from typing import Optional, Union
 
+import aiohttp
 import discord
 from discord.ext import commands
 from discord import app_commands, ui, Embed, ButtonStyle
@@ -29,79 +33,128 @@ intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
+# 버튼 view는 (disabled,) 두 가지 변형뿐이라 매 edit마다 새로 만들 필요가 없다.
+# 상태는 custom_id로만 라우팅하므로 경매끼리 공유해도 안전하다.
+@functools.lru_cache(maxsize=2)
+def _build_view(disabled: bool) -> ui.View:
+    view = ui.View(timeout=None)
+    view.add_item(ui.Button(label="💰입찰하기", custom_id="bid_open",
+                            style=ButtonStyle.primary, disabled=disabled))
+    view.add_item(ui.Button(label="✖️조기 종료", custom_id="auction_end",
+                            style=ButtonStyle.secondary, disabled=disabled))
+    return view
+
 # ===== 경매 상태 =====
 class AuctionState:
+    __slots__ = (
+        "channel", "message", "item", "start_price", "highest_bid",
+        "highest_bidder_id", "ends_at", "owner_id", "task",
+        "_dirty", "_end_event", "_ended", "_pending_edit", "_embed_template",
+    )
+
     def __init__(
         self,
         channel: Union[discord.TextChannel, discord.Thread, discord.DMChannel],
-        message: discord.Message,
         item: str,
         start_price: int,
         duration_sec: int,
         owner: discord.Member
     ):
         self.channel = channel
-        self.message = message
+        self.message: Optional[discord.Message] = None  # start()에서 연결
         self.item = item
         self.start_price = start_price
         self.highest_bid = start_price
-        self.highest_bidder: Optional[discord.Member] = None
-        self.ends_at = discord.utils.utcnow().timestamp() + duration_sec
-        self.owner = owner
-        self.lock = asyncio.Lock()
+        self.highest_bidder_id: Optional[int] = None  # Member 전체를 붙들지 않는다
+        self.ends_at = _now() + duration_sec
+        self.owner_id = owner.id  # 권한 확인에는 id만 필요
+        self._dirty: bool = False  # 마지막 edit 이후 입찰가가 바뀌었는지
+        self._end_event = asyncio.Event()  # 조기 종료 신호
+        self._ended: bool = False  # 종료 처리는 정확히 한 번만
+        self._pending_edit: Optional[asyncio.Task] = None  # 예약된 지연 edit
+        self.task: Optional[asyncio.Task] = None
+
+        # 임베드 골격은 한 번만 만들고, edit마다 동적 필드만 덮어쓴다
+        self._embed_template = Embed(
+            title="⚡️경매 진행 중⚡️",
+            description=f"**아이템:** {self.item}",
+            color=0x000000
+        )
+        self._embed_template.add_field(name="최고 입찰가", value="-", inline=True)
+        # <t:..:R>는 클라이언트가 실시간 갱신하고 ends_at은 불변이므로 여기서 확정
+        self._embed_template.add_field(name="남은 시간",
+                                       value=f"<t:{int(self.ends_at)}:R>",
+                                       inline=True)
+        self._embed_template.set_footer(text="버튼을 눌러 입찰하고, 모달에 금액을 입력하세요.")
+
+    def start(self, message: discord.Message) -> None:
+        """경매 메시지를 연결하고 카운트다운을 시작한다."""
+        self.message = message
         self.task = asyncio.create_task(self._run_countdown())
 
     def money_fmt(self, n: int) -> str:
         return f"{n:,}₩"
 
     def make_embed(self) -> Embed:
-        remaining = max(0, int(self.ends_at - discord.utils.utcnow().timestamp()))
-        ends_at_ts = int(self.ends_at)
         highest_line = (
-            f"**{self.money_fmt(self.highest_bid)}** (<@{self.highest_bidder.id}>)"
-            if self.highest_bidder else
+            f"**{self.money_fmt(self.highest_bid)}** (<@{self.highest_bidder_id}>)"
+            if self.highest_bidder_id else
             f"아직 없음 (시작가: **{self.money_fmt(self.start_price)}**)"
         )
-        embed = Embed(
-            title="⚡️경매 진행 중⚡️",
-            description=f"**아이템:** {self.item}",
-            color=0x000000
-        )
-        embed.add_field(name="최고 입찰가", value=highest_line, inline=True)
-        embed.add_field(
-            name="남은 시간",
-            value=f"{remaining}초 (<t:{ends_at_ts}:R>)",
-            inline=True
-        )
-        embed.set_footer(text="버튼을 눌러 입찰하고, 모달에 금액을 입력하세요.")
-        return embed
+        self._embed_template.set_field_at(0, name="최고 입찰가",
+                                          value=highest_line, inline=True)
+        return self._embed_template
 
     def buttons(self, disabled: bool = False) -> ui.View:
-        view = ui.View(timeout=None)
-        view.add_item(ui.Button(label="💰입찰하기", custom_id="bid_open",
-                                style=ButtonStyle.primary, disabled=disabled))
-        view.add_item(ui.Button(label="✖️조기 종료", custom_id="auction_end",
-                                style=ButtonStyle.secondary, disabled=disabled))
-        return view
+        return _build_view(disabled)
 
     async def _run_countdown(self):
+        # sleep_until은 내부에서 델타를 다시 계산하므로 루프가 밀려도 정시에 깨어난다
+        deadline = datetime.fromtimestamp(self.ends_at, tz=timezone.utc)
+        sleep_task = asyncio.create_task(discord.utils.sleep_until(deadline))
+        event_task = asyncio.create_task(self._end_event.wait())
         try:
-            while True:
-                await asyncio.sleep(5)
-                remaining = self.ends_at - discord.utils.utcnow().timestamp()
-                if remaining <= 0:
-                    await end_auction(self, "시간 종료")
-                    break
-                try:
-                    await self.message.edit(embed=self.make_embed(),
-                                            view=self.buttons(False))
-                except Exception as e:
-                    print("주기 업데이트 실패(무시):", repr(e))
+            done, pending = await asyncio.wait(
+                {sleep_task, event_task},
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in pending:
+                task.cancel()
+            if sleep_task in done:
+                await end_auction(self, "시간 종료")
+            # 이벤트로 깨어난 경우엔 set()을 호출한 쪽이 종료 처리를 맡는다
         except asyncio.CancelledError:
-            pass
+            sleep_task.cancel()
+            event_task.cancel()
 
 # 채널별 경매상태 저장
 auctions = {}  # key: channel.id, value: AuctionState
+# 채널별 락: 입찰/주기 업데이트/종료가 같은 임계 구역을 공유
+channel_locks: defaultdict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+async def _debounced_edit(state: AuctionState):
+    # 짧은 창 동안 연속 입찰을 모아 edit 한 번으로 처리
+    while True:
+        await asyncio.sleep(0.2)
+        # 종료 임베드와의 경합을 막기 위해 edit은 채널 락 안에서 수행한다
+        async with channel_locks[state.channel.id]:
+            if state._ended:
+                return  # 종료 결과 임베드를 덮어쓰지 않는다
+            state._dirty = False
+            try:
+                await state.message.edit(embed=state.make_embed(),
+                                         view=state.buttons(False))
+            except Exception as e:
+                print("지연 업데이트 실패(무시):", repr(e))
+        # edit 도중 새 입찰이 커밋됐으면 한 번 더 돌아 최신가를 렌더
+        if not state._dirty:
+            return
+
+def schedule_edit(state: AuctionState) -> None:
+    """경매 메시지 edit을 백그라운드로 예약한다. 이미 예약돼 있으면 합쳐진다."""
+    if state._pending_edit and not state._pending_edit.done():
+        return
+    state._pending_edit = asyncio.create_task(_debounced_edit(state))
 
 # ===== 모달(입찰) =====
 class BidModal(ui.Modal, title="입찰하기"):
@@ -121,40 +174,58 @@ class BidModal(ui.Modal, title="입찰하기"):
             await interaction.response.send_message("이미 종료된 경매입니다.", ephemeral=True)
             return
 
-        async with state.lock:
-            now_ts = discord.utils.utcnow().timestamp()
-            if now_ts >= state.ends_at:
-                state.task.cancel()
-                await end_auction(state, "시간 종료")
-                await interaction.response.send_message("이미 시간이 종료되었습니다.", ephemeral=True)
-                return
-
-            raw = (self.bid_value.value or "").strip()
-            digits = re.sub(r"\D", "", raw)  # 숫자만 추출
-            if not digits:
-                await interaction.response.send_message("정수를 입력해주세요.", ephemeral=True)
-                return
-
-            bid = int(digits)
-            if bid <= state.highest_bid or bid < state.start_price:
-                await interaction.response.send_message(
-                    f"현재가(**{state.money_fmt(state.highest_bid)}**)보다 높은 금액을 입력하세요.",
-                    ephemeral=True
-                )
-                return
-
-            # 업데이트
-            state.highest_bid = bid
-            state.highest_bidder = interaction.user
-            try:
-                await state.message.edit(embed=state.make_embed(), view=state.buttons(False))
-            except Exception as e:
-                print("즉시 업데이트 실패(무시):", repr(e))
+        # 락 안에서는 검증과 커밋만 수행하고, HTTP 호출은 전부 락 밖으로 뺀다
+        ended = False
+        expired = False
+        error: Optional[str] = None
+        async with channel_locks[state.channel.id]:
+            now_ts = _now()
+            if state._ended:
+                # 조기 종료 등으로 이미 끝난 경매에는 커밋하지 않는다
+                ended = True
+            elif now_ts >= state.ends_at:
+                expired = True
+            else:
+                raw = (self.bid_value.value or "").strip()
+                try:
+                    bid = int(raw)
+                except ValueError:
+                    bid = None
+                if bid is None:
+                    error = "정수를 입력해주세요."
+                # highest_bid >= start_price 불변식이라 하한 검사는 이 비교 하나로 충분
+                elif bid <= state.highest_bid:
+                    error = (
+                        f"현재가(**{state.money_fmt(state.highest_bid)}**)보다 "
+                        "높은 금액을 입력하세요."
+                    )
+                else:
+                    # 업데이트 (원자적 커밋)
+                    state.highest_bid = bid
+                    state.highest_bidder_id = interaction.user.id
+                    state._dirty = True
+
+        if ended:
+            await interaction.response.send_message("이미 종료된 경매입니다.", ephemeral=True)
+            return
 
-            await interaction.response.send_message(
-                f"입찰 성공! 현재 최고가는 **{state.money_fmt(bid)}**입니다.",
-                ephemeral=True
-            )
+        # 락을 해제한 뒤 종료 처리 (end_auction이 같은 락을 잡음)
+        if expired:
+            state._end_event.set()
+            await end_auction(state, "시간 종료")
+            await interaction.response.send_message("이미 시간이 종료되었습니다.", ephemeral=True)
+            return
+
+        if error is not None:
+            await interaction.response.send_message(error, ephemeral=True)
+            return
+
+        # edit은 백그라운드로 미뤄서 입찰 응답이 rate limit 버킷에 묶이지 않게 한다
+        schedule_edit(state)
+        await interaction.response.send_message(
+            f"입찰 성공! 현재 최고가는 **{state.money_fmt(bid)}**입니다.",
+            ephemeral=True
+        )
 
 # ===== 봇 이벤트/커맨드 =====
 @bot.event
@@ -192,15 +263,40 @@ async def auction(
 
     await interaction.response.defer()
 
-    # 우선 '준비중' 메시지 전송
-    msg = await interaction.followup.send(embed=Embed(title="경매 준비중..."))
-
-    # 상태 생성 및 등록
-    state = AuctionState(channel, msg, 아이템, 시작금액, 진행초, interaction.user)
+    # 상태를 먼저 만들고 완성된 임베드로 한 번에 전송 (준비중 메시지 + edit 불필요)
+    state = AuctionState(channel, 아이템, 시작금액, 진행초, interaction.user)
+    msg = await interaction.followup.send(embed=state.make_embed(),
+                                          view=state.buttons(False))
+    state.start(msg)
     auctions[channel.id] = state
 
-    # 본문으로 교체
-    await msg.edit(embed=state.make_embed(), view=state.buttons(False))
+async def _handle_bid_open(interaction: discord.Interaction, state: Optional[AuctionState]):
+    if not state:
+        await interaction.response.send_message("이미 종료된 경매입니다.", ephemeral=True)
+        return
+    await interaction.response.send_modal(BidModal(state))
+
+async def _handle_auction_end(interaction: discord.Interaction, state: Optional[AuctionState]):
+    if not state:
+        await interaction.response.send_message("이미 종료된 경매입니다.", ephemeral=True)
+        return
+    # guild_permissions는 역할 비트를 합산하므로 개설자 본인이면 아예 건드리지 않는다
+    if (interaction.user.id != state.owner_id
+            and not interaction.user.guild_permissions.manage_messages):
+        await interaction.response.send_message(
+            "❗️개설자 또는 관리자만 조기 종료할 수 있어요❗️",
+            ephemeral=True
+        )
+        return
+    state._end_event.set()
+    await interaction.response.send_message("경매를 종료했어요.", ephemeral=True)
+    await end_auction(state, "조기 종료")
+
+# custom_id -> 핸들러. 버튼이 늘어도 dict 조회 한 번으로 분기
+HANDLERS = {
+    "bid_open": _handle_bid_open,
+    "auction_end": _handle_auction_end,
+}
 
 @bot.event
 async def on_interaction(interaction: discord.Interaction):
@@ -208,37 +304,24 @@ async def on_interaction(interaction: discord.Interaction):
     if interaction.type != discord.InteractionType.component:
         return
 
-    custom_id = interaction.data.get("custom_id")
-    channel_id = interaction.channel.id
-    state: Optional[AuctionState] = auctions.get(channel_id)
-
-    if custom_id == "bid_open":
-        if not state:
-            await interaction.response.send_message("이미 종료된 경매입니다.", ephemeral=True)
-            return
-        await interaction.response.send_modal(BidModal(state))
-
-    elif custom_id == "auction_end":
-        if not state:
-            await interaction.response.send_message("이미 종료된 경매입니다.", ephemeral=True)
-            return
-        is_owner = interaction.user.id == state.owner.id
-        is_mod = interaction.user.guild_permissions.manage_messages
-        if not (is_owner or is_mod):
-            await interaction.response.send_message(
-                "❗️개설자 또는 관리자만 조기 종료할 수 있어요❗️",
-                ephemeral=True
-            )
-            return
-        state.task.cancel()
-        await interaction.response.send_message("경매를 종료했어요.", ephemeral=True)
-        await end_auction(state, "조기 종료")
+    handler = HANDLERS.get(interaction.data.get("custom_id"))
+    if handler:
+        await handler(interaction, auctions.get(interaction.channel.id))
 
 # ===== 종료 처리 =====
 async def end_auction(state: AuctionState, reason: str):
+    # 타이머 만료와 조기 종료가 동시에 들어와도 종료 처리는 한 번만
+    if state._ended:
+        return
+    state._ended = True
+
+    # 뒤늦게 발사될 지연 edit이 종료 임베드를 덮어쓰지 못하게 취소
+    if state._pending_edit is not None:
+        state._pending_edit.cancel()
+
     winner_text = (
-        f"🏆 우승자: <@{state.highest_bidder.id}> — **{state.money_fmt(state.highest_bid)}**"
-        if state.highest_bidder else "입찰자가 없어 낙찰 실패"
+        f"🏆 우승자: <@{state.highest_bidder_id}> — **{state.money_fmt(state.highest_bid)}**"
+        if state.highest_bidder_id else "입찰자가 없어 낙찰 실패"
     )
     embed = Embed(title="🔔 경매 종료", description=f"**아이템:** {state.item}", color=0xDD2E44)
     embed.add_field(name="결과", value=winner_text, inline=False)
@@ -247,11 +330,22 @@ async def end_auction(state: AuctionState, reason: str):
     embed.timestamp = discord.utils.utcnow()
 
     try:
-        await state.message.edit(embed=embed, view=state.buttons(True))
-        await state.channel.send(winner_text)
+        async with channel_locks[state.channel.id]:
+            # 결과는 수정된 임베드가 이미 보여주므로 별도 채널 메시지는 보내지 않는다
+            await state.message.edit(embed=embed, view=state.buttons(True))
     except Exception as e:
         print("종료 업데이트 실패(무시):", repr(e))
     finally:
         auctions.pop(getattr(state.channel, "id", None), None)
-
-bot.run(TOKEN)
+        channel_locks.pop(getattr(state.channel, "id", None), None)
+
+async def _main():
+    # keep-alive 커넥터를 넉넉하게 잡아 edit 버스트 때 TCP/TLS 핸드셰이크를 아낀다.
+    # 커넥터는 러닝 루프가 필요해서 여기서 만들고, 세션 생성(login) 전에 주입한다.
+    connector = aiohttp.TCPConnector(limit=100, limit_per_host=50,
+                                     ttl_dns_cache=300, keepalive_timeout=75)
+    async with bot:
+        bot.http.connector = connector
+        await bot.start(TOKEN)
+
+asyncio.run(_main())